@@ -1,9 +1,6 @@
 import os
 
-try:
-	import pymel.core as pm
-except:
-	raise ImportError("Must have PyMEL installed. Update your Maya installation to include this.")
+import maya.cmds as cmds
 import maya.mel as mm
 import shutil
 import sys
@@ -11,6 +8,18 @@ import sys
 sys.dont_write_bytecode = True
 
 
+def _copy_if_different(src, dst_dir):
+	"""
+	Copy file into folder unless the destination is already the same file
+	"""
+	dst = os.path.join(dst_dir, os.path.basename(src))
+	if os.path.exists(dst) and os.path.samefile(src, dst):
+		print('{} is identical to {}\nSkipping...'.format(src, dst))
+		return False
+	shutil.copy2(src, dst)
+	return True
+
+
 def onMayaDroppedPythonFile(*args):
 	"""
 	Drag and drop install tool
@@ -18,47 +27,37 @@ def onMayaDroppedPythonFile(*args):
 	cur_path = os.path.dirname(__file__)
 	api_file = os.path.join(cur_path, 'metahuman_api.py')
 	mh_file = os.path.join(cur_path, 'metahuman_facial_transfer.py')
+	help_file = os.path.join(cur_path, 'metahuman_facial_transfer_help.txt')
 	mel_file = os.path.join(cur_path, 'shelf_Metahuman.mel')
 	
-	scripts_folder = pm.internalVar(userScriptDir=True)
-	shelf_dir = pm.internalVar(userShelfDir=True)
+	scripts_folder = cmds.internalVar(userScriptDir=True)
+	shelf_dir = cmds.internalVar(userShelfDir=True)
 	shelf_file = os.path.join(shelf_dir, 'shelf_Metahuman.mel').replace('\\', '/')
-	result = pm.confirmDialog(title='Install Metahuman Transfer Tool',
-	                          message='Installing Tool to:\n{}\n\nContinue?'.format(scripts_folder),
-	                          button=['Continue', 'Cancel'],
-	                          defaultButton='Continue',
-	                          cancelButton='Cancel',
-	                          dismissString='Cancel')
+	result = cmds.confirmDialog(title='Install Metahuman Transfer Tool',
+	                            message='Installing Tool to:\n{}\n\nContinue?'.format(scripts_folder),
+	                            button=['Continue', 'Cancel'],
+	                            defaultButton='Continue',
+	                            cancelButton='Cancel',
+	                            dismissString='Cancel')
 	if result == 'Continue':
 		# Copy files and load shelf
-		updated = False
-		if os.path.exists(os.path.join(scripts_folder, 'metahuman_api.py')) or \
-			os.path.exists(os.path.join(scripts_folder, 'metahuman_facial_transfer.py')) or \
-			os.path.exists(os.path.join(shelf_dir, 'shelf_Metahuman.mel')):
-			updated = True
+		scripts_names = set(os.listdir(scripts_folder)) if os.path.isdir(scripts_folder) else set()
+		shelf_names = set(os.listdir(shelf_dir)) if os.path.isdir(shelf_dir) else set()
+		tool_names = {'metahuman_api.py', 'metahuman_facial_transfer.py', 'metahuman_facial_transfer_help.txt'}
+		updated = bool(tool_names & scripts_names) or \
+			'shelf_Metahuman.mel' in shelf_names
 		
-		try:
-			shutil.copy(api_file, scripts_folder)
-		except shutil.SameFileError:
-			print('{} is identical to {}\{}\nSkipping...'.format(api_file, scripts_folder, api_file))
-			pass
-		try:
-			shutil.copy(mh_file, scripts_folder)
-		except shutil.SameFileError:
-			print('{} is identical to {}\{}\nSkipping...'.format(mh_file, scripts_folder, mh_file))
-			pass
-		try:
-			shutil.copy(mel_file, shelf_dir)
-		except shutil.SameFileError:
-			print('{} is identical to {}\{}\nSkipping...'.format(mel_file, shelf_file, mel_file))
-			pass
+		_copy_if_different(api_file, scripts_folder)
+		_copy_if_different(mh_file, scripts_folder)
+		_copy_if_different(help_file, scripts_folder)
+		_copy_if_different(mel_file, shelf_dir)
 		
 		# Load shelf if doesn't exist
-		if not pm.shelfLayout('Metahuman', query=True, exists=True):
+		if not cmds.shelfLayout('Metahuman', query=True, exists=True):
 			mm.eval('loadNewShelf("{}")'.format(shelf_file))
 		if not updated:
-			pm.confirmDialog(title='Installed', message='Installed!\nClick on new shelf button to launch tool.',
-			                 button=['Okay'], defaultButton='Okay')
+			cmds.confirmDialog(title='Installed', message='Installed!\nClick on new shelf button to launch tool.',
+			                   button=['Okay'], defaultButton='Okay')
 		else:
-			pm.confirmDialog(title='Install Updated', message='Files Update!\t\t\t\nRestart Maya!',
-			                 button=['Okay'], defaultButton='Okay')
+			cmds.confirmDialog(title='Install Updated', message='Files Update!\t\t\t\nRestart Maya!',
+			                   button=['Okay'], defaultButton='Okay')
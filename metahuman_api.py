@@ -4,6 +4,7 @@
 
 from functools import wraps
 import logging
+import math
 import time
 
 try:
@@ -11,38 +12,43 @@ try:
 except:
 	raise ImportError("Must have PyMEL installed. Update your Maya installation to include this.")
 import maya.cmds as cmds
+import maya.api.OpenMaya as om
 import pymel.versions
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
 # Excluded from zeroing out
-ZERO_OUT_EXCLUDED_CONTROLS = ['CTRL_eyesAimFollowHead',
-                              'CTRL_faceGUIfollowHead'
-                              'CTRL_lookAtSwitch',
-                              'CTRL_rigLogicSwitch',
-                              'CTRL_neckCorrectivesMultiplyerU',
-                              'CTRL_neckCorrectivesMultiplyerM',
-                              'CTRL_neckCorrectivesMultiplyerD',
-                              'CTRL_faceGUI',
-                              'CTRL_GUIswitch',
-                              'CTRL_L_mouth_lipsPressD',
-                              'CTRL_R_mouth_lipsPressD',
-                              'CTRL_expressions',
-                              'CTRL_rigLogic'
-                              ]
-
-EXCLUDED_RETARGET_CONTROLS = ['CTRL_C_eye',
-                              'CTRL_C_eyesAim',
-                              'CTRL_L_eyeAim',
-                              'CTRL_R_eyeAim',
-							  'CTRL_lookAtSwitch',
-                              'CTRL_convergenceSwitch',
-                              'CTRL_faceTweakersGUI']
-
-EXCLUDED_RETARGET_CONTROLS.extend(ZERO_OUT_EXCLUDED_CONTROLS)
+ZERO_OUT_EXCLUDED_CONTROLS = frozenset(['CTRL_eyesAimFollowHead',
+                                        'CTRL_faceGUIfollowHead',
+                                        'CTRL_lookAtSwitch',
+                                        'CTRL_rigLogicSwitch',
+                                        'CTRL_neckCorrectivesMultiplyerU',
+                                        'CTRL_neckCorrectivesMultiplyerM',
+                                        'CTRL_neckCorrectivesMultiplyerD',
+                                        'CTRL_faceGUI',
+                                        'CTRL_GUIswitch',
+                                        'CTRL_L_mouth_lipsPressD',
+                                        'CTRL_R_mouth_lipsPressD',
+                                        'CTRL_expressions',
+                                        'CTRL_rigLogic'
+                                        ])
+
+EXCLUDED_RETARGET_CONTROLS = frozenset(['CTRL_C_eye',
+                                        'CTRL_C_eyesAim',
+                                        'CTRL_L_eyeAim',
+                                        'CTRL_R_eyeAim',
+                                        'CTRL_lookAtSwitch',
+                                        'CTRL_convergenceSwitch',
+                                        'CTRL_faceTweakersGUI']) | ZERO_OUT_EXCLUDED_CONTROLS
+
 DEFAULT_NAMESPACE = ':'
 
+# Driven control channel from the axis suffix of an FBX control board attribute
+CHANNEL_MAP = {'X': 'translateX',
+               'Y': 'translateY',
+               'Z': 'translateZ'}
+
 
 class ControllerError(Exception):
 	pass
@@ -55,12 +61,13 @@ class MetahumanError(Exception):
 
 class Controller:
 	
-	def __init__(self, control, ctrl_expressions_node):
+	def __init__(self, control, ctrl_expressions_node, control_mapping=None):
 		'''
 		Class to hold and train facial expressions to control channel attributes
 		Args:
 			control (pm.nt.Transform): control node
 			ctrl_expressions_node (pm.nt.Transform): transform node that holds facial expressions
+			control_mapping (dict): mapping already built by train_controls, the control is trained if None
 		'''
 		if not isinstance(control, pm.nt.Transform):
 			raise ControllerError('{} is not a control transform'.format(control))
@@ -70,57 +77,17 @@ class Controller:
 		if ctrl_expressions_node.stripNamespace() != 'CTRL_expressions':
 			raise ControllerError('{} is not the CTRL_expressions node!'.format(ctrl_expressions_node))
 		
-		expression_list = ctrl_expressions_node.listAttr(userDefined=True, scalar=True)
-		expression_list = [exp.attrName() for exp in expression_list]
-		
-		if not expression_list:
-			raise ControllerError('Missing expressions on the {}! Unable to process!'.format(ctrl_expressions_node))
-		
 		self.control = control
 		self._ctrl_expressions_node = ctrl_expressions_node
-		self._expression_list = expression_list
 		self._control_mapping = {}
-		self.train_control_expressions()
+		if control_mapping is None:
+			self.train_control_expressions()
+		else:
+			self._control_mapping = control_mapping
 	
 	def train_control_expressions(self):
-		''' Trains controls to expression by determining the control limits and what's keyable
-			and creates a mapping between the controls attribute and driven expression
-			
-			While the controls are driven with a similar animCurve name that the incoming FBX data will have,
-			there's a few animCurves that don't follow this convention so will train the data. Takes longer
-			to build but more reliable.
-		'''
-		control_limits = {}
-		self._control_mapping = {}
-		mapping = {}
-		free_to_change = pm.Attribute.FreeToChangeState.freeToChange
-		if self.control.attr('tx').isFreeToChange() == free_to_change and self.control.attr('tx').isKeyable():
-			control_limits[self.control.attr('tx')] = [pm.transformLimits(self.control, translationX=True, query=True),
-			                                           'tx']
-		if self.control.attr('ty').isFreeToChange() == free_to_change and self.control.attr('ty').isKeyable():
-			control_limits[self.control.attr('ty')] = [pm.transformLimits(self.control, translationY=True, query=True),
-			                                           'ty']
-		if control_limits:
-			for control_attr, (ctrl_limits, channel_name) in control_limits.items():
-				for value in ctrl_limits:
-					# Set the control value which will drive the expression
-					control_attr.set(value)
-					
-					# Loop through expressions to determine what is active
-					for exp in self._expression_list:
-						cur_value = self._ctrl_expressions_node.attr(exp).get()
-						if cur_value > 0 or cur_value < 0:
-							# The expression name matches the keyframed attribute name from incoming FBX file
-							# This will make it easier to connect the keyframe data to a control
-							driven_anim_name = 'CTRL_expressions_{}'.format(exp)
-							mapping[driven_anim_name] = [self.control.attr(channel_name), value]
-				# Reset the control
-				control_attr.set(0.0)
-				
-		for key, (attr, value) in mapping.items():
-			if attr not in self._control_mapping:
-				self._control_mapping[attr] = []
-			self._control_mapping[attr].append([key, value])
+		''' Trains this control on its own, see train_controls '''
+		self._control_mapping = train_controls([self.control], self._ctrl_expressions_node)[self.control]
 			
 	@property
 	def control_mapping(self):
@@ -132,6 +99,72 @@ class Controller:
 		else:
 			return False
 
+def train_controls(controls, ctrl_expressions_node):
+	'''
+	Trains controls to expression by determining the control limits and what's keyable
+	and creates a mapping between the controls attribute and driven expression
+	
+	While the controls are driven with a similar animCurve name that the incoming FBX data will have,
+	there's a few animCurves that don't follow this convention so will train the data. Takes longer
+	to build but more reliable.
+	
+	All the control channels are driven one after another in a single pass and the expressions are
+	read back from plain plug names, so no Attribute wrappers are built per control.
+	Args:
+		controls (list of pm.nt.Transform): control nodes
+		ctrl_expressions_node (pm.nt.Transform): transform node that holds facial expressions
+	Returns:
+		dict: {control: {control plug: [[driven anim name, driver value], ...]}}
+	'''
+	expression_list = ctrl_expressions_node.listAttr(userDefined=True, scalar=True)
+	expression_list = [exp.attrName() for exp in expression_list]
+	
+	if not expression_list:
+		raise ControllerError('Missing expressions on the {}! Unable to process!'.format(ctrl_expressions_node))
+	
+	# Full plug names so the expressions can be read with cmds instead of PyMEL Attributes
+	node_name = ctrl_expressions_node.name()
+	expression_plugs = ['{}.{}'.format(node_name, exp) for exp in expression_list]
+	
+	# Gather every control channel that can be driven along with its limits
+	control_channels = []
+	for control in controls:
+		control_name = control.name()
+		settable = set(cmds.listAttr(control_name, keyable=True, unlocked=True, settable=True) or [])
+		for attr_name, channel_name, limit_flag in (('translateX', 'tx', 'translationX'),
+		                                            ('translateY', 'ty', 'translationY')):
+			if attr_name in settable:
+				ctrl_limits = cmds.transformLimits(control_name, query=True, **{limit_flag: True})
+				control_channels.append((control, '{}.{}'.format(control_name, channel_name), ctrl_limits))
+	
+	mappings = {control: {} for control in controls}
+	for control, control_plug, ctrl_limits in control_channels:
+		mapping = mappings[control]
+		for value in ctrl_limits:
+			# Set the control value which will drive the expression
+			cmds.setAttr(control_plug, value)
+			
+			# Loop through expressions to determine what is active
+			values = [cmds.getAttr(plug) for plug in expression_plugs]
+			for exp, cur_value in zip(expression_list, values):
+				if cur_value > 0 or cur_value < 0:
+					# The expression name matches the keyframed attribute name from incoming FBX file
+					# This will make it easier to connect the keyframe data to a control
+					driven_anim_name = 'CTRL_expressions_{}'.format(exp)
+					mapping[driven_anim_name] = [control_plug, value]
+		# Reset the control
+		cmds.setAttr(control_plug, 0.0)
+	
+	control_mappings = {}
+	for control, mapping in mappings.items():
+		control_mapping = {}
+		for key, (control_plug, value) in mapping.items():
+			if control_plug not in control_mapping:
+				control_mapping[control_plug] = []
+			control_mapping[control_plug].append([key, value])
+		control_mappings[control] = control_mapping
+	return control_mappings
+
 def show_wait_cursor(func):
 	''' Decorator for waitCursor'''
 	@wraps(func)
@@ -144,14 +177,47 @@ def show_wait_cursor(func):
 		return result
 	return wrapper 
 
+def undo_chunk(func):
+	''' Decorator to record everything the function does as a single undo chunk'''
+	@wraps(func)
+	def wrapper(*args, **kwargs):
+		cmds.undoInfo(openChunk=True, chunkName=func.__name__)
+		try:
+			result = func(*args, **kwargs)
+		finally:
+			cmds.undoInfo(closeChunk=True)
+		return result
+	return wrapper
+
+def suspend_scene_updates(func):
+	''' Decorator to turn off viewport refresh, parallel evaluation, cycle checks and auto key while it runs'''
+	@wraps(func)
+	def wrapper(*args, **kwargs):
+		eval_mode = cmds.evaluationManager(query=True, mode=True)[0]
+		cycle_check = cmds.cycleCheck(query=True, evaluation=True)
+		auto_key = cmds.autoKeyframe(query=True, state=True)
+		cmds.evaluationManager(mode='off')
+		cmds.cycleCheck(evaluation=False)
+		cmds.autoKeyframe(state=False)
+		cmds.refresh(suspend=True)
+		try:
+			result = func(*args, **kwargs)
+		finally:
+			cmds.refresh(suspend=False)
+			cmds.autoKeyframe(state=auto_key)
+			cmds.cycleCheck(evaluation=cycle_check)
+			cmds.evaluationManager(mode=eval_mode)
+			cmds.refresh()
+		return result
+	return wrapper
+
 def load_plugin(plugin_name='fbxmaya'):
 	'''
 	Load the plugin if not already loaded
 	Args:
 		plugin_name (str): name of plugin
 	'''
-	loaded_plugins = pm.pluginInfo(listPlugins=True, query=True)
-	if plugin_name not in loaded_plugins:
+	if not cmds.pluginInfo(plugin_name, query=True, loaded=True):
 		pm.loadPlugin(plugin_name, quiet=True)
 
 def get_face_controls(namespace=DEFAULT_NAMESPACE):
@@ -164,22 +230,22 @@ def get_face_controls(namespace=DEFAULT_NAMESPACE):
 	'''
 	control_set = 'FacialControls'
 	face_control_set = '{}{}'.format(namespace, control_set)
-	if pm.objExists(face_control_set):
-		pm.select(face_control_set, replace=True)
-		controls = pm.selected()
-	else:
-		# If we're missing the FacialControls set, will look by CTRL_ convention naming
-		controls = pm.ls('{}{}'.format(namespace, 'CTRL_*'), type=pm.nt.Transform)
-		
-	face_controls = []
-	# Some controls are shapes so make sure the list is just transforms
-	for control in controls:
-		if isinstance(control, pm.nt.Transform):
-			face_controls.append(control)
-		if isinstance(control, pm.nt.Mesh):
-			face_controls.append(control.getTransform())
-	pm.select(clear=True)
-	return face_controls
+	if cmds.objExists(face_control_set):
+		members = cmds.sets(face_control_set, query=True) or []
+		# ls treats an empty list as no filter and would return every node in the scene
+		if not members:
+			return []
+		# Some controls are shapes so make sure the list is just transforms
+		controls = cmds.ls(members, type='transform', long=True)
+		meshes = cmds.ls(members, type='mesh', long=True)
+		if meshes:
+			controls.extend(cmds.listRelatives(meshes, parent=True, fullPath=True) or [])
+		if not controls:
+			return []
+		return pm.ls(controls)
+	
+	# If we're missing the FacialControls set, will look by CTRL_ convention naming
+	return pm.ls('{}{}'.format(namespace, 'CTRL_*'), type=pm.nt.Transform)
 
 def select_face_controls(namespace=DEFAULT_NAMESPACE):
 	'''
@@ -210,9 +276,11 @@ def zero_out_face_controls(namespace=DEFAULT_NAMESPACE):
 	if controls:
 		result = True
 	for control in controls:
-		if control.stripNamespace() not in ZERO_OUT_EXCLUDED_CONTROLS:
+		control_name = control.stripNamespace()
+		if control_name not in ZERO_OUT_EXCLUDED_CONTROLS:
+			settable = set(cmds.listAttr(control.name(), unlocked=True, settable=True, string='translate*') or [])
 			control.translateY.set(0.0)
-			if not control.translateX.isLocked():
+			if 'translateX' in settable:
 				control.translateX.set(0.0)
 	if selection:
 		pm.select(selection, replace=True)
@@ -239,12 +307,20 @@ def get_controllers(namespace=DEFAULT_NAMESPACE):
 		return [], error_msg
 	# Zero out controls so we get the proper control mapping
 	zero_out_face_controls(namespace)
-	controllers = []
+	expression_node = pm.PyNode(expression_node)
+	retarget_controls = []
 	for face_control in face_controls:
-		if face_control.stripNamespace() not in EXCLUDED_RETARGET_CONTROLS:
-			controller = Controller(face_control, pm.PyNode(expression_node))
-			if controller.is_valid():
-				controllers.append(controller)
+		control_name = face_control.stripNamespace()
+		if control_name not in EXCLUDED_RETARGET_CONTROLS:
+			retarget_controls.append(face_control)
+	
+	# Train all the controls in one pass and hand each Controller its mapping
+	control_mappings = train_controls(retarget_controls, expression_node)
+	controllers = []
+	for face_control in retarget_controls:
+		controller = Controller(face_control, expression_node, control_mappings[face_control])
+		if controller.is_valid():
+			controllers.append(controller)
 	return controllers, error_msg
 
 def import_fbx_animation(fbx_path):
@@ -253,7 +329,7 @@ def import_fbx_animation(fbx_path):
 	Args:
 		fbx_path (str): absolute path to fbx animation
 	Returns:
-		(list of pm.nt.DagNode): list of imported nodes
+		(list of str): list of imported node names
 	'''
 	# Import animation
 	pm.mel.FBXImportShapes(v=False)
@@ -263,9 +339,28 @@ def import_fbx_animation(fbx_path):
 	pm.mel.FBXImportProtectDrivenKeys(v=True)
 	pm.mel.FBXImportSetMayaFrameRate(v=False)
 	
-	cur_nodes = pm.ls()
-	pm.mel.FBXImport(file=fbx_path, take=1)
-	return set(pm.ls()) - set(cur_nodes)
+	# Collect nodes as they are created rather than diffing the whole scene before and after
+	# Names are resolved after the import since the importer renames nodes as it goes
+	new_handles = []
+	def node_added(node, *args):
+		new_handles.append(om.MObjectHandle(node))
+	
+	callback_id = om.MDGMessage.addNodeAddedCallback(node_added, 'dependNode')
+	try:
+		pm.mel.FBXImport(file=fbx_path, take=1)
+	finally:
+		om.MMessage.removeCallback(callback_id)
+	
+	new_nodes = []
+	for handle in new_handles:
+		if not handle.isValid():
+			continue
+		node = handle.object()
+		if node.hasFn(om.MFn.kDagNode):
+			new_nodes.append(om.MDagPath.getAPathTo(node).fullPathName())
+		else:
+			new_nodes.append(om.MFnDependencyNode(node).name())
+	return new_nodes
 
 def export_fbx_animation(fbx_path, namespace=DEFAULT_NAMESPACE):
 	'''
@@ -298,35 +393,50 @@ def export_fbx_animation(fbx_path, namespace=DEFAULT_NAMESPACE):
 	pm.select(face_controls, replace=True)
 	current_namespace = face_controls[0].namespace()
 	controls = []
-	# Handle exporting control animation if in namespace
-	if current_namespace:
-		# Set to root namespace
-		pm.Namespace(':').setCurrent()
-		for control in face_controls:
-			control_name = str(control.stripNamespace())
-			dup_control = pm.duplicate(control, returnRootsOnly=True, inputConnections=True)[0]
-			new_control = pm.rename(dup_control, control_name)
-			controls.append(new_control)
-		pm.select(controls, replace=True)
-	# Set it back to current namespace
-	pm.Namespace(current_namespace).setCurrent()
-	pm.mel.FBXResetExport()
-	pm.mel.FBXExportAnimationOnly(v=True)
-	pm.mel.FBXExportBakeComplexAnimation(v=False)
-	pm.mel.FBXExportLights(v=False)
-	pm.mel.FBXExportCameras(v=False)
-	pm.mel.FBXExportConstraints(v=False)
-	pm.mel.FBXExportSkins(v=False)
-	pm.mel.FBXExportApplyConstantKeyReducer(v=False)
-	pm.mel.FBXExportSmoothMesh(v=False)
-	pm.mel.FBXExportShapes(v=False)
-	pm.mel.FBXExportEmbeddedTextures(v=False)
-	pm.mel.FBXExportInputConnections(v=False)
-	pm.mel.FBXExportFileVersion(v='FBX202000')
-	pm.mel.FBXExport(file=fbx_path, s=True)
-	pm.mel.eval('FBXExport -f "{}" -s'.format(fbx_path))
-	if controls:
-		pm.delete(controls)
+	renamed_controls = []
+	try:
+		# Handle exporting control animation if in namespace
+		if current_namespace:
+			# Set to root namespace
+			pm.Namespace(':').setCurrent()
+			control_names = [str(control.stripNamespace()) for control in face_controls]
+			# Move the controls into the root namespace for the export instead of duplicating them with all their
+			# anim curves. Referenced controls can't leave their namespace so those still get duplicated
+			if not any(control.isReferenced() for control in face_controls) and \
+					not cmds.ls([':' + name for name in control_names]):
+				for control, control_name in zip(face_controls, control_names):
+					control.rename(':' + control_name)
+					# Track each rename as it happens so a failure partway through still gets restored
+					renamed_controls.append((control, control_name))
+			else:
+				for control, control_name in zip(face_controls, control_names):
+					dup_control = pm.duplicate(control, returnRootsOnly=True, inputConnections=True)[0]
+					new_control = pm.rename(dup_control, control_name)
+					controls.append(new_control)
+				pm.select(controls, replace=True)
+		
+		pm.mel.FBXResetExport()
+		pm.mel.FBXExportAnimationOnly(v=True)
+		pm.mel.FBXExportBakeComplexAnimation(v=False)
+		pm.mel.FBXExportLights(v=False)
+		pm.mel.FBXExportCameras(v=False)
+		pm.mel.FBXExportConstraints(v=False)
+		pm.mel.FBXExportSkins(v=False)
+		pm.mel.FBXExportApplyConstantKeyReducer(v=False)
+		pm.mel.FBXExportSmoothMesh(v=False)
+		pm.mel.FBXExportShapes(v=False)
+		pm.mel.FBXExportEmbeddedTextures(v=False)
+		pm.mel.FBXExportInputConnections(v=False)
+		pm.mel.FBXExportFileVersion(v='FBX202000')
+		pm.mel.FBXExport(file=fbx_path, s=True)
+	finally:
+		# Set it back to current namespace
+		pm.Namespace(current_namespace or ':').setCurrent()
+		# Restore the controls back into their namespace
+		for control, control_name in renamed_controls:
+			control.rename(':{}{}'.format(current_namespace.lstrip(':'), control_name))
+		if controls:
+			pm.delete(controls)
 	return face_controls
 
 def get_root_joint(joint_list):
@@ -362,11 +472,68 @@ def get_key_frame_ranges(nodes):
     Returns:
     	tuple(float, float): start, end of keyframes
 	'''
-	start_frames = [get_key_frame_range(node)[0] for node in nodes]
-	end_frames = [get_key_frame_range(node)[1] for node in nodes]
-	return min(start_frames), max(end_frames)
+	# Query all the nodes at once, findKeyframe looks across every curve it is given
+	node_names = [node.name() for node in nodes]
+	return float(cmds.findKeyframe(node_names, which='first')), float(cmds.findKeyframe(node_names, which='last'))
+
+def bake_anim_curves(driven_curves, start_frame, end_frame):
+	'''
+	Connects anim curves to control channels through blendWeighted nodes and bakes every channel in one pass
+	Args:
+		driven_curves (dict): {control plug: [(anim curve, weight), ...]}
+		start_frame (float): first frame to bake
+		end_frame (float): last frame to bake
+	Returns:
+		(list of str): baked control plugs
+	'''
+	# Round outwards so fractional key times at either end still fall inside the baked frames
+	bake_range = (math.floor(start_frame), math.ceil(end_frame))
+	blend_weighted_nodes = []
+	existing_curves = {}
+	for control_plug, anim_curves in driven_curves.items():
+		# Hold on to any curve already on the channel, connecting the blendWeighted node disconnects it
+		existing_curve = cmds.listConnections(control_plug, source=True, destination=False, type='animCurve')
+		if existing_curve:
+			existing_curves[control_plug] = existing_curve[0]
+		# The blendWeighted node keeps the source curves untouched, the bake creates new curves on the controls
+		bw_node = cmds.createNode('blendWeighted')
+		for i, (anim_curve, weight) in enumerate(anim_curves):
+			cmds.connectAttr('{}.output'.format(anim_curve), '{}.input[{}]'.format(bw_node, i))
+			cmds.setAttr('{}.weight[{}]'.format(bw_node, i), weight)
+		cmds.connectAttr('{}.output'.format(bw_node), control_plug, force=True)
+		blend_weighted_nodes.append(bw_node)
+	
+	baked_plugs = list(driven_curves)
+	if baked_plugs:
+		pm.bakeResults(baked_plugs, 
+						time=bake_range, 
+						preserveOutsideKeys=True, 
+						sparseAnimCurveBake=False,
+						sampleBy=1, 
+						oversamplingRate=1,
+						removeBakedAttributeFromLayer=False, 
+						removeBakedAnimFromLayer=False,
+						shape=False, 
+						controlPoints=False, 
+						disableImplicitControl=True)
+	
+	if blend_weighted_nodes:
+		cmds.delete(blend_weighted_nodes)
+	
+	# Merge the keys outside of the bake range back in from the replaced curves, the same as pasteKey used to
+	for control_plug, existing_curve in existing_curves.items():
+		cmds.cutKey(existing_curve, time=bake_range, clear=True)
+		if cmds.keyframe(existing_curve, query=True, keyframeCount=True):
+			first_key = cmds.findKeyframe(existing_curve, which='first')
+			cmds.copyKey(existing_curve)
+			cmds.pasteKey(control_plug, time=(first_key, first_key), option='merge')
+		if not cmds.referenceQuery(existing_curve, isNodeReferenced=True):
+			cmds.delete(existing_curve)
+	return baked_plugs
 
 @show_wait_cursor
+@undo_chunk
+@suspend_scene_updates
 def retarget_metahuman_animation_sequence(fbx_path, namespace=DEFAULT_NAMESPACE, timeunit='ntsc'):
 	'''
 	Imports the fbx animation into the scene and connects the curve data to the control rig.
@@ -400,90 +567,71 @@ def retarget_metahuman_animation_sequence(fbx_path, namespace=DEFAULT_NAMESPACE,
 	if error:
 		return elapsed_time, error
 	
-	new_nodes = import_fbx_animation(fbx_path)
+	new_node_names = import_fbx_animation(fbx_path)
+	# ls and delete both fall back to the whole scene or the selection when handed an empty list
+	if not new_node_names:
+		error_msg = '{} is an empty file!'.format(fbx_path)
+		return elapsed_time, error_msg
 
 	pm.currentUnit(time=timeunit)
 
 	# Check if animCurves came in
-	anim_curves = pm.ls(new_nodes, type=pm.nt.AnimCurve)
+	anim_curves = pm.ls(new_node_names, type=pm.nt.AnimCurve)
 	if not anim_curves:
 		error_msg = "No animation curves present!\n\n" \
 		            "Ensure the exported animation is from an animation sequence!"
-		pm.delete(new_nodes)
+		if new_node_names:
+			cmds.delete(new_node_names)
 		return elapsed_time, error_msg
 	
-	new_joints = pm.ls(new_nodes, type=pm.nt.Joint)
+	new_joints = pm.ls(new_node_names, type=pm.nt.Joint)
 	root_joint = get_root_joint(new_joints)
 	if not root_joint:
-		pm.delete(new_nodes)
 		error_msg = 'Did not find the root joint from: {}.\n' \
 		            'Ensure the exported animation is from an animation sequence!'.format(fbx_path)
-		pm.delete(new_nodes)
+		if new_node_names:
+			cmds.delete(new_node_names)
 		return elapsed_time, error_msg
 		
 	# Get the range of keys
 	start_frame, end_frame = get_key_frame_range(root_joint)
 	
 	# Take the mapping data and copy animation keys over to the proper control.channel
-	blend_weighted_nodes = []
-	controls_attrs_to_bake = []
+	# Work with plug strings and maya.cmds here, this loop runs for every expression on every control
+	root_name = root_joint.name()
+	# Map each expression attribute on the root joint to its anim curve once, controls share expressions
+	root_curves = {}
+	for attr in cmds.listAttr(root_name, userDefined=True) or []:
+		anim_curve = cmds.listConnections('{}.{}'.format(root_name, attr), source=True, destination=False,
+		                                  type='animCurve')
+		root_curves[attr] = anim_curve[0] if anim_curve else None
+	driven_curves = {}
 	for controller in controllers:
-		for control_attr, expression_data in controller.control_mapping.items():
-
-			# Connect control channel that has more than one anim curve driving it
-			if len(expression_data) > 1:
-				anim_curves = []
-				for index, (expression, driver_value) in enumerate(expression_data):				
-					if root_joint.hasAttr(expression):
-						anim_curve = root_joint.attr(expression).inputs(type=pm.nt.AnimCurve)
-						if anim_curve:
-							# Control moves in the negative
-							if driver_value == -1.0:
-								# Get the anim curve and scale it by -1 
-								pm.scaleKey(anim_curve[0], valueScale=-1.0)
-						else:
-							logger.error('No animation curve for {}'.format(root_joint.attr(expression)))
-						
-						anim_curves.append(anim_curve[0])
-					else:
-						logger.warning('{} does not have {} in the name. This will be skipped!'.format(root_joint, expression))
-				
-				# Connect anim curves
-				bw_node = pm.createNode('blendWeighted')
-				for i, anim_curve in enumerate(anim_curves):
-					anim_curve.output.connect(bw_node.input[i])
-				bw_node.output.connect(control_attr)
-				controls_attrs_to_bake.append(control_attr)
-			else:
-				for index, (expression, driver_value) in enumerate(expression_data):
-					if root_joint.hasAttr(expression):
-						anim_curve = root_joint.attr(expression).inputs(type=pm.nt.AnimCurve)
-						if anim_curve:
-							copied = pm.copyKey(root_joint.attr(expression))
-							if copied:
-								try:
-									pm.pasteKey(control_attr)
-								except RuntimeError:
-									logger.error('Failed to paste keys to {}'.format(control_attr))
+		for control_plug, expression_data in controller.control_mapping.items():
+			anim_curves = []
+			for expression, driver_value in expression_data:
+				if expression in root_curves:
+					anim_curve = root_curves[expression]
+					if anim_curve:
+						# Control moves in the negative when more than one anim curve drives it
+						# Weighted on the blendWeighted input so the shared source curve is left untouched
+						weight = 1.0
+						if driver_value == -1.0 and len(expression_data) > 1:
+							weight = -1.0
+						anim_curves.append((anim_curve, weight))
 					else:
-						logger.warning('{} does not have {} in the name. This will be skipped!'.format(root_joint, expression))
+						logger.error('No animation curve for {}.{}'.format(root_name, expression))
+				else:
+					logger.warning('{} does not have {} in the name. This will be skipped!'.format(root_name, expression))
+			if anim_curves:
+				driven_curves[control_plug] = anim_curves
 	
 	# Bake controls
-	pm.bakeResults(controls_attrs_to_bake, 
-					time=[int(start_frame), int(end_frame)], 
-					preserveOutsideKeys=True, 
-					sparseAnimCurveBake=False,
-					sampleBy=1, 
-					oversamplingRate=1,
-					removeBakedAttributeFromLayer=False, 
-					removeBakedAnimFromLayer=False,
-					shape=False, 
-					controlPoints=False, 
-					disableImplicitControl=True)
+	bake_anim_curves(driven_curves, start_frame, end_frame)
 				
 	# Clean up
-	pm.delete(blend_weighted_nodes) 	
-	pm.delete(new_nodes)
+	if new_node_names:
+		cmds.delete(new_node_names)
 
 	pm.playbackOptions(animationStartTime=int(start_frame), animationEndTime=int(end_frame))
 
@@ -493,6 +641,8 @@ def retarget_metahuman_animation_sequence(fbx_path, namespace=DEFAULT_NAMESPACE,
 	return elapsed_time, error_msg
 
 
+@undo_chunk
+@suspend_scene_updates
 def retarget_metahuman_level_sequence(fbx_path, namespace=DEFAULT_NAMESPACE, timeunit='film'):
 	'''
 	This currently is only supported in Maya 2022.4, 2022.5 and 2023.3
@@ -516,23 +666,25 @@ def retarget_metahuman_level_sequence(fbx_path, namespace=DEFAULT_NAMESPACE, tim
 	elapsed_time = ''
 	
 	supported_versions = [20200400, 20220400, 20220500, 20230300]
-	if pymel.versions.current() not in supported_versions:
-		error_msg = 'This version (year.cut) of Maya is not currently supported: {}'.format(pymel.versions.current())
+	maya_version = pymel.versions.current()
+	if maya_version not in supported_versions:
+		error_msg = 'This version (year.cut) of Maya is not currently supported: {}'.format(maya_version)
 		return elapsed_time, error_msg
 
 	pm.currentUnit(time=timeunit)
 	
-	nodes = pm.createReference(fbx_path, namespace=':', returnNewNodes=True)
-	reference_file = None
-	for node in pm.ls(nodes, type=pm.nt.Reference):
-		reference_file = node.referenceFile()
-		if reference_file:
-			break
+	existing_reference_nodes = set(cmds.ls(type='reference'))
+	nodes = cmds.file(fbx_path, reference=True, namespace=':', returnNewNodes=True) or []
+	# An empty file brings in no nodes to query, so find the reference node it created instead
+	reference_nodes = nodes[:1] or [node for node in cmds.ls(type='reference') if node not in existing_reference_nodes]
+	# Keep the copy number so the right reference is removed if this file is already referenced in the scene
+	reference_file = cmds.referenceQuery(reference_nodes[0], filename=True,
+	                                     withoutCopyNumber=False) if reference_nodes else None
 			
 	if not nodes:
 		error_msg = '{} is an empty file!'.format(fbx_path)
 		if reference_file:
-			reference_file.remove()
+			cmds.file(reference_file, removeReference=True, force=True)
 		return elapsed_time, error_msg
 	
 	# Check if animCurves came in
@@ -542,71 +694,56 @@ def retarget_metahuman_level_sequence(fbx_path, namespace=DEFAULT_NAMESPACE, tim
 		            "Export Facial animation from Animation Sequence \n" \
 		            "Then use 'Import FBX Animation Sequence File'"
 		if reference_file:
-			reference_file.remove()
+			cmds.file(reference_file, removeReference=True, force=True)
 		return elapsed_time, error_msg
 	
-	control_board = None
-	for node in pm.ls(nodes):
-		if node.stripNamespace() == 'Face_ControlBoard_CtrlRig':
-			control_board = node
-			break
-	if control_board is None:
+	# Match on the short name without namespace so only the one node gets looked at
+	control_boards = [node for node in nodes
+	                  if node.rsplit('|', 1)[-1].rsplit(':', 1)[-1] == 'Face_ControlBoard_CtrlRig']
+	if not control_boards:
 		error_msg = "Missing Face_ControlBoard_CtrlRig node!\nUnable to import animation!"
 		if reference_file:
-			reference_file.remove()
+			cmds.file(reference_file, removeReference=True, force=True)
 		return elapsed_time, error_msg
+	control_board = control_boards[0]
 	
-	keyed_attributes = {}
-	for keyed_attr in control_board.listAttr(keyable=True):
-		attr_name = keyed_attr.attrName()
-		if 'CTRL_' in attr_name:
-			index = attr_name.find("FBX")
-			if index != -1:
-				channel_name = attr_name[-1]
-				if channel_name == 'X':
-					driven_channel = 'translateX'
-				elif channel_name == 'Y':
-					driven_channel = 'translateY'
-				elif channel_name == 'Z':
-					driven_channel = 'translateZ'
-				else:
-					driven_channel = 'translateY'
-				control_name = attr_name[:index]
-				if control_name not in EXCLUDED_RETARGET_CONTROLS:
-					control_name = '{}{}'.format(namespace, control_name)
-					result = (control_name, driven_channel)
-					keyed_attributes[keyed_attr] = result
-			else:
-				if attr_name not in EXCLUDED_RETARGET_CONTROLS:
-					control_name = '{}{}'.format(namespace, attr_name)
-					result = (control_name, 'translateY')
-					keyed_attributes[keyed_attr] = result
-	
-	copied_keys = []
-	for driver_attr, (control_name, channel) in keyed_attributes.items():
-		if pm.objExists(control_name):
-			driven_attr = pm.Attribute('{}.{}'.format(control_name, channel))
-			if driven_attr.isFreeToChange() == pm.Attribute.FreeToChangeState.freeToChange and not driven_attr.isLocked():
-				copied = pm.copyKey(driver_attr)
-				if copied:
-					try:
-						pm.pasteKey(driven_attr)
-					except RuntimeError:
-						logger.error('Failed to paste keys to {}'.format(driven_attr))
-					copied_keys.append(driven_attr)
-
-	if len(copied_keys) == 0:
+	# Keep the driver and driven plugs as parallel lists of plain plug names
+	src_plugs = []
+	dst_plugs = []
+	# Let listAttr filter down to the control attributes
+	for attr_name in cmds.listAttr(control_board, keyable=True, string='*CTRL_*') or []:
+		control_name, sep, tail = attr_name.partition('FBX')
+		if sep:
+			driven_channel = CHANNEL_MAP.get(tail[-1:], 'translateY')
+		else:
+			driven_channel = 'translateY'
+		if control_name not in EXCLUDED_RETARGET_CONTROLS:
+			control_name = namespace + control_name
+			if cmds.objExists(control_name):
+				driven_attr = control_name + '.' + driven_channel
+				if cmds.getAttr(driven_attr, settable=True):
+					src_plugs.append(control_board + '.' + attr_name)
+					dst_plugs.append(driven_attr)
+	
+	# Drive the controls from the referenced anim curves so they can all be baked in one pass
+	driven_curves = {}
+	for src_plug, dst_plug in zip(src_plugs, dst_plugs):
+		anim_curve = cmds.listConnections(src_plug, source=True, destination=False, type='animCurve')
+		# Unkeyed curves have nothing to bake so leave them out of the bake entirely
+		if anim_curve and cmds.keyframe(anim_curve[0], query=True, keyframeCount=True):
+			driven_curves[dst_plug] = [(anim_curve[0], 1.0)]
+
+	if not driven_curves:
 		error_msg = "Missing animation data. Possible incompatible FBX data."
 		if reference_file:
-			reference_file.remove()
+			cmds.file(reference_file, removeReference=True, force=True)
 		return elapsed_time, error_msg
 	
+	key_times = cmds.keyframe([curves[0][0] for curves in driven_curves.values()], query=True, timeChange=True) or [0.0]
+	bake_anim_curves(driven_curves, min(key_times), max(key_times))
+	
 	# Cleanup
-	for node in pm.ls(nodes, type=pm.nt.Reference):
-		reference_file = node.referenceFile()
-		if reference_file:
-			reference_file.remove()
-			break
+	cmds.file(reference_file, removeReference=True, force=True)
 	
 	delta_time = time.gmtime(time.time() - start_time)
 	elapsed_time = str(time.strftime("%H:%M:%S", delta_time))
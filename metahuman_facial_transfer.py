@@ -31,7 +31,7 @@
 
 import os
 import logging
-from functools import partial
+from functools import wraps
 try:
 	# Maya <= 2025
 	from PySide6 import QtWidgets
@@ -44,29 +44,62 @@ except ImportError:
 	from PySide2 import QtGui
 
 from maya.app.general.mayaMixin import MayaQWidgetBaseMixin
+import maya.cmds as cmds
 
-try:
-	import pymel.core as pm
-except:
-	raise ImportError("Must have PyMEL installed. Update your Maya installation to include this.")
-
-import metahuman_api as mh_api
+# PyMEL is slow to import so it, along with metahuman_api which needs it, is imported on first use
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
+def _requires_metahuman(func):
+	''' Decorator to warn and skip the action when no Metahuman has been set '''
+	@wraps(func)
+	def wrapper(self, *args, **kwargs):
+		if self._current_mh_name is None:
+			self._warn_no_metahuman()
+			return
+		return func(self, *args, **kwargs)
+	return wrapper
+
+
 class UI(MayaQWidgetBaseMixin, QtWidgets.QWidget):
 	"""	UI Class """
 	
 	WIN_NAME = "mhFacialTool"
 	TITLE = 'Metahuman Facial Tool'
 	
+	_BTN_STYLE = ("QPushButton{background-color: "
+	              "rgb(50, 50, 50); color: orange; solid black 1px:}"
+	              "QPushButton:hover{background-color: "
+	              "rgb(25, 25, 25); color: orange; solid black 1px:}")
+	
+	_LINE_STYLE = ("QLineEdit{background-color: "
+	               "rgb(50, 50, 50); color: orange; solid black 1px:}")
+	
+	# Fonts need a running QApplication so these are built on first launch
+	_BOLD_FONT = None
+	_BUTTON_FONT = None
+	_style_ready = False
+	
+	@classmethod
+	def _init_style_cache(cls):
+		''' Build the shared fonts once per session '''
+		if cls._style_ready:
+			return
+		cls._BOLD_FONT = QtGui.QFont()
+		cls._BOLD_FONT.setBold(True)
+		cls._BUTTON_FONT = QtGui.QFont()
+		cls._BUTTON_FONT.setBold(True)
+		cls._BUTTON_FONT.setPointSize(9)
+		cls._style_ready = True
+	
 	def __init__(self, *args, **kwargs):
 		super(UI, self).__init__(*args, **kwargs)
+		UI._init_style_cache()
 		
-		if pm.window(UI.WIN_NAME, query=True, exists=True):
-			pm.deleteUI(UI.WIN_NAME, window=True)
+		if cmds.window(UI.WIN_NAME, query=True, exists=True):
+			cmds.deleteUI(UI.WIN_NAME, window=True)
 		
 		self._current_namespace = ''
 		self._current_mh_name = None
@@ -75,36 +108,28 @@ class UI(MayaQWidgetBaseMixin, QtWidgets.QWidget):
 		self.setWindowTitle(UI.TITLE)
 		self.setWindowFlags(QtCore.Qt.Window)
 		
-		btn_styles = ("QPushButton{background-color: "
-		             "rgb(50, 50, 50); color: orange; solid black 1px:}"
-		             "QPushButton:hover{background-color: "
-		             "rgb(25, 25, 25); color: orange; solid black 1px:}")
-		
-		line_styles = ("QLineEdit{background-color: "
-		               "rgb(50, 50, 50); color: orange; solid black 1px:}")
+		# Message boxes are reused for every dialog instead of building a new widget each time
+		self._msg_cache = {}
 		
 		qbox_style = QtWidgets.QStyleFactory.create('Windows')
 		
 		main_layout = QtWidgets.QVBoxLayout()
-		bold_font = QtGui.QFont()
-		bold_font.setBold(True)
-		bold_font.setPointSize(9)
 		
 		combo_layout = QtWidgets.QHBoxLayout()
 		help_button = QtWidgets.QPushButton('?')
 		help_button.setToolTip('Help')
 		help_button.setToolTip('Help documentation')
 		help_button.setFixedSize(QtCore.QSize(34, 34))
-		help_button.setStyleSheet(btn_styles)
-		help_button.setFont(bold_font)
-		help_button.clicked.connect(self._help_dialog)
+		help_button.setStyleSheet(UI._BTN_STYLE)
+		help_button.setFont(UI._BUTTON_FONT)
+		help_button.clicked.connect(self._help_dialog, QtCore.Qt.DirectConnection)
 		
 		set_mh_button = QtWidgets.QPushButton('Set Current Metahuman -->')
 		set_mh_button.setToolTip('Select any part of your Metahuman and hit the button to set current Metahuman')
 		set_mh_button.setMinimumWidth(300)
-		set_mh_button.setStyleSheet(btn_styles)
-		set_mh_button.setFont(bold_font)
-		set_mh_button.clicked.connect(self._set_metahuman_name)
+		set_mh_button.setStyleSheet(UI._BTN_STYLE)
+		set_mh_button.setFont(UI._BUTTON_FONT)
+		set_mh_button.clicked.connect(self._set_metahuman_name, QtCore.Qt.DirectConnection)
 		
 		self.mh_name = QtWidgets.QLineEdit()
 		self.mh_name.setReadOnly(True)
@@ -112,9 +137,9 @@ class UI(MayaQWidgetBaseMixin, QtWidgets.QWidget):
 		self.mh_name.setPlaceholderText('<No Metahuman Set>')
 		self.mh_name.setToolTip('Select any part of your Metahuman and hit the button to set current Metahuman')
 		self.mh_name.setMinimumWidth(250)
-		self.mh_name.setFont(bold_font)
+		self.mh_name.setFont(UI._BUTTON_FONT)
 		self.mh_name.setAlignment(QtCore.Qt.AlignCenter)
-		self.mh_name.setStyleSheet(line_styles)
+		self.mh_name.setStyleSheet(UI._LINE_STYLE)
 		
 		combo_layout.addWidget(help_button)
 		combo_layout.addWidget(set_mh_button)
@@ -127,16 +152,19 @@ class UI(MayaQWidgetBaseMixin, QtWidgets.QWidget):
 		import_anim_button = QtWidgets.QPushButton('Import FBX Animation Sequence File...')
 		import_anim_button.setToolTip('Navigate to FBX exported from Animation Sequence.\n'
 		                              'Slower to complete but more compatible between Maya versions')
-		import_anim_button.setStyleSheet(btn_styles)
-		import_anim_button.setFont(bold_font)
-		import_anim_button.clicked.connect(partial(self.import_metahuman_animation, 'anim'))
+		import_anim_button.setStyleSheet(UI._BTN_STYLE)
+		import_anim_button.setFont(UI._BUTTON_FONT)
+		# clicked passes the checked state along, the lambdas keep it away from the decorated methods
+		import_anim_button.clicked.connect(lambda checked=False: self.import_metahuman_animation('anim'),
+		                                   QtCore.Qt.DirectConnection)
 
 		import_level_button = QtWidgets.QPushButton('Import FBX Level Sequence File...')
 		import_level_button.setToolTip('Navigate to FBX exported from Level Sequence.\n'
 		                               'Faster to complete')
-		import_level_button.setStyleSheet(btn_styles)
-		import_level_button.setFont(bold_font)
-		import_level_button.clicked.connect(partial(self.import_metahuman_animation, 'level'))
+		import_level_button.setStyleSheet(UI._BTN_STYLE)
+		import_level_button.setFont(UI._BUTTON_FONT)
+		import_level_button.clicked.connect(lambda checked=False: self.import_metahuman_animation('level'),
+		                                    QtCore.Qt.DirectConnection)
 		
 		import_layout.addWidget(import_anim_button)
 		import_layout.addWidget(import_level_button)
@@ -146,9 +174,9 @@ class UI(MayaQWidgetBaseMixin, QtWidgets.QWidget):
 		export_layout = QtWidgets.QVBoxLayout()
 		export_button = QtWidgets.QPushButton('Export Facial FBX')
 		export_button.setToolTip('Export face control animation')
-		export_button.setStyleSheet(btn_styles)
-		export_button.setFont(bold_font)
-		export_button.clicked.connect(self.export_fbx)
+		export_button.setStyleSheet(UI._BTN_STYLE)
+		export_button.setFont(UI._BUTTON_FONT)
+		export_button.clicked.connect(lambda checked=False: self.export_fbx(), QtCore.Qt.DirectConnection)
 		export_box.setLayout(export_layout)
 		export_layout.addWidget(export_button)
 
@@ -157,23 +185,23 @@ class UI(MayaQWidgetBaseMixin, QtWidgets.QWidget):
 		controls_layout = QtWidgets.QVBoxLayout()
 		reset_button = QtWidgets.QPushButton('Reset Facial Controls')
 		reset_button.setToolTip('Restores face controls to default position')
-		reset_button.setFont(bold_font)
-		reset_button.setStyleSheet(btn_styles)
-		reset_button.clicked.connect(self.zero_out_face_controls)
+		reset_button.setFont(UI._BUTTON_FONT)
+		reset_button.setStyleSheet(UI._BTN_STYLE)
+		reset_button.clicked.connect(lambda checked=False: self.zero_out_face_controls(), QtCore.Qt.DirectConnection)
 		
 		select_button = QtWidgets.QPushButton('Select Facial Controls')
 		select_button.setToolTip('Selects face controls for keying')
-		select_button.setStyleSheet(btn_styles)
-		select_button.setFont(bold_font)
-		select_button.clicked.connect(self.select_face_controls)
+		select_button.setStyleSheet(UI._BTN_STYLE)
+		select_button.setFont(UI._BUTTON_FONT)
+		select_button.clicked.connect(lambda checked=False: self.select_face_controls(), QtCore.Qt.DirectConnection)
 		controls_layout.addWidget(reset_button)
 		controls_layout.addWidget(select_button)
 		control_box.setLayout(controls_layout)
 
 		close_button = QtWidgets.QPushButton('Close')
-		close_button.setStyleSheet(btn_styles)
-		close_button.setFont(bold_font)
-		close_button.clicked.connect(self.close)
+		close_button.setStyleSheet(UI._BTN_STYLE)
+		close_button.setFont(UI._BUTTON_FONT)
+		close_button.clicked.connect(self.close, QtCore.Qt.DirectConnection)
 		
 		import_box.setLayout(import_layout)
 		main_layout.addLayout(combo_layout)
@@ -194,47 +222,58 @@ class UI(MayaQWidgetBaseMixin, QtWidgets.QWidget):
 	def closeEvent(self, event):
 		event.accept()
 	
+	def _show(self, title, text, icon=QtWidgets.QMessageBox.Information, bold=False):
+		'''
+		Show a message box, reusing one box per icon
+		Args:
+			title (str): window title
+			text (str): message to display
+			icon (QtWidgets.QMessageBox.Icon): message box icon
+			bold (bool): display the message in bold
+		'''
+		msg_box = self._msg_cache.get(icon)
+		if msg_box is None:
+			msg_box = self._msg_cache[icon] = QtWidgets.QMessageBox(self)
+			msg_box.setIcon(icon)
+		msg_box.setWindowTitle(title)
+		msg_box.setText(text)
+		msg_box.setFont(UI._BOLD_FONT if bold else self.font())
+		msg_box.exec_()
+	
+	def _warn_no_metahuman(self):
+		''' Let the user know a Metahuman needs to be set first '''
+		self._show("Metahuman: Selection Error",
+		           "Missing selection!\nSelect any thing on your Metahuman\nClick 'Set Current Metahuman'",
+		           QtWidgets.QMessageBox.Critical)
+	
+	@_requires_metahuman
 	def export_fbx(self):
 		''' Export FBX Animation '''
-		if self._current_mh_name is None:
-			msg_box = QtWidgets.QMessageBox()
-			msg_box.setWindowTitle("Metahuman: Selection Error")
-			msg_box.setText("Missing selection!\nSelect any thing on your Metahuman\nClick 'Set Current Metahuman'")
-			msg_box.setIcon(QtWidgets.QMessageBox.Critical)
-			msg_box.exec_()
-			return
-				
-		file_path = pm.fileDialog2(fileFilter='(*.fbx)', dialogStyle=1, caption='Export FBX Animation')
+		import metahuman_api as mh_api
+		
+		file_path = cmds.fileDialog2(fileFilter='(*.fbx)', dialogStyle=1, caption='Export FBX Animation')
 		if file_path:
 			# Strip namespace before export and then restore
 
 			results = mh_api.export_fbx_animation(file_path[0], self._current_namespace)
 			if results:
-				msg_box = QtWidgets.QMessageBox()
-				msg_box.setWindowTitle("Export Completed")
-				msg_box.setText('Export Completed!')
-				msg_box.setIcon(QtWidgets.QMessageBox.Information)
-				msg_box.exec_()
+				self._show("Export Completed", 'Export Completed!')
 
 	def _set_metahuman_name(self):
 		''' Set the Metahuman name and current namespace '''
+		import pymel.core as pm
+		
 		selected = pm.selected()
 		if not selected:
-			msg_box = QtWidgets.QMessageBox()
-			msg_box.setWindowTitle("Metahuman: Selection Error")
-			msg_box.setText("Missing selection!\nSelect any thing on your Metahuman\nClick 'Set Current Metahuman'")
-			msg_box.setIcon(QtWidgets.QMessageBox.Critical)
-			msg_box.exec_()
+			self._warn_no_metahuman()
 			return
 		current_namespace = pm.Namespace(selected[0].namespace())
 		nodes = current_namespace.ls()
 		embedded_node = pm.ls(nodes, type=pm.nt.EmbeddedNodeRL4)
 		if not embedded_node:
-			msg_box = QtWidgets.QMessageBox()
-			msg_box.setWindowTitle("Metahuman: Missing node")
-			msg_box.setText("Missing critical node, embeddedNodeRL4, used for rig logic!")
-			msg_box.setIcon(QtWidgets.QMessageBox.Critical)
-			msg_box.exec_()
+			self._show("Metahuman: Missing node",
+			           "Missing critical node, embeddedNodeRL4, used for rig logic!",
+			           QtWidgets.QMessageBox.Critical)
 			return
 		embedded_node = embedded_node[0]
 		file_path = embedded_node.dnaFilePath.get()
@@ -244,34 +283,25 @@ class UI(MayaQWidgetBaseMixin, QtWidgets.QWidget):
 		self._current_namespace = embedded_node.namespace()
 		pm.Namespace(embedded_node.namespace()).setCurrent()
 	
+	@_requires_metahuman
 	def import_metahuman_animation(self, transfer_type):
 		'''
 		Opens up a file dialog to bring in metahuman fbx data
 		Args:
 			transfer_type (str): 'anim' or 'level' for animation data
 		'''
-		if self._current_mh_name is None:
-			msg_box = QtWidgets.QMessageBox()
-			msg_box.setWindowTitle("Metahuman: Selection Error")
-			msg_box.setText("Missing selection!\nSelect any thing on your Metahuman\nClick 'Set Current Metahuman'")
-			msg_box.setIcon(QtWidgets.QMessageBox.Critical)
-			msg_box.exec_()
-			return
+		import metahuman_api as mh_api
+		
 		controls = mh_api.get_face_controls(self._current_namespace)
-		bold_font = QtGui.QFont()
-		bold_font.setBold(True)
 		if not controls:
-			msg_box = QtWidgets.QMessageBox()
-			msg_box.setWindowTitle("Metahuman: Missing Controls")
-			msg_box.setText("Missing Metahuman facial controls!\nUnable to import animation!")
-			msg_box.setIcon(QtWidgets.QMessageBox.Critical)
-			msg_box.setFont(bold_font)
-			msg_box.exec_()
+			self._show("Metahuman: Missing Controls",
+			           "Missing Metahuman facial controls!\nUnable to import animation!",
+			           QtWidgets.QMessageBox.Critical, bold=True)
 			return
 		
-		file_path = pm.fileDialog2(fileFilter='(FBX (*.fbx)',
-		                           fileMode=1,
-		                           caption='(FBX) Exported Metahuman facial data')
+		file_path = cmds.fileDialog2(fileFilter='(FBX (*.fbx)',
+		                             fileMode=1,
+		                             caption='(FBX) Exported Metahuman facial data')
 		if file_path:
 			if transfer_type == 'anim':
 				elapsed_time, errors = mh_api.retarget_metahuman_animation_sequence(file_path[0],
@@ -281,132 +311,54 @@ class UI(MayaQWidgetBaseMixin, QtWidgets.QWidget):
 				                                                                self._current_namespace)
 			
 			if errors:
-				title = "Transfer Failed!"
-				message = errors
-				icon = QtWidgets.QMessageBox.Critical
+				self._show("Transfer Failed!", errors, QtWidgets.QMessageBox.Critical, bold=True)
 			else:
-				title = "Transfer Complete!"
-				message = "Animation Transferred in: {}".format(elapsed_time)
-				icon = QtWidgets.QMessageBox.Information
-			
-			msg_box = QtWidgets.QMessageBox()
-			msg_box.setWindowTitle(title)
-			msg_box.setText(message)
-			msg_box.setIcon(icon)
-			msg_box.setFont(bold_font)
-			msg_box.exec_()
+				self._show("Transfer Complete!",
+				           "Animation Transferred in: {}".format(elapsed_time),
+				           bold=True)
 			
+	@_requires_metahuman
 	def select_face_controls(self):
 		'''	Select face controls '''
-		if self._current_mh_name is None:
-			msg_box = QtWidgets.QMessageBox()
-			msg_box.setWindowTitle("Metahuman: Selection Error")
-			msg_box.setText("Missing selection!\nSelect any thing on your Metahuman\nClick 'Set Current Metahuman'")
-			msg_box.setIcon(QtWidgets.QMessageBox.Critical)
-			msg_box.exec_()
-			return
+		import metahuman_api as mh_api
+		
 		result = mh_api.select_face_controls(self._current_namespace)
 		if not result:
-			bold_font = QtGui.QFont()
-			bold_font.setBold(True)
-			msg_box = QtWidgets.QMessageBox()
-			msg_box.setWindowTitle("Operation Failed")
-			msg_box.setText('Missing Face Controls or Metahuman not Set!\nMake sure your Metahuman is set!')
-			msg_box.setIcon(QtWidgets.QMessageBox.Critical)
-			msg_box.setFont(bold_font)
-			msg_box.exec_()
+			self._show("Operation Failed",
+			           'Missing Face Controls or Metahuman not Set!\nMake sure your Metahuman is set!',
+			           QtWidgets.QMessageBox.Critical, bold=True)
 			
+	@_requires_metahuman
 	def zero_out_face_controls(self):
 		'''	Zero out face controls '''
-		if self._current_mh_name is None:
-			msg_box = QtWidgets.QMessageBox()
-			msg_box.setWindowTitle("Metahuman: Selection Error")
-			msg_box.setText("Missing selection!\nSelect any thing on your Metahuman\nClick 'Set Current Metahuman'")
-			msg_box.setIcon(QtWidgets.QMessageBox.Critical)
-			msg_box.exec_()
-			return
+		import metahuman_api as mh_api
+		
 		result = mh_api.zero_out_face_controls(self._current_namespace)
 		if not result:
-			bold_font = QtGui.QFont()
-			bold_font.setBold(True)
-			msg_box = QtWidgets.QMessageBox()
-			msg_box.setWindowTitle("Operation Failed")
-			msg_box.setText('Missing Face Controls or Metahuman not Set!\nMake sure your Metahuman is set!')
-			msg_box.setIcon(QtWidgets.QMessageBox.Critical)
-			msg_box.setFont(bold_font)
-			msg_box.exec_()
+			self._show("Operation Failed",
+			           'Missing Face Controls or Metahuman not Set!\nMake sure your Metahuman is set!',
+			           QtWidgets.QMessageBox.Critical, bold=True)
 
 
 class HelpDialog(QtWidgets.QDialog):
+	
+	# Loaded from metahuman_facial_transfer_help.txt the first time the dialog opens
+	_INFO = None
+	_HELP_FILE = 'metahuman_facial_transfer_help.txt'
+	
 	def __init__(self, parent=None):
 		super(HelpDialog, self).__init__(parent)
+		UI._init_style_cache()
 		self.setWindowTitle("Metahuman Facial Help")
-		info = '''
-Metahuman Facial Tool provides a few functions to aid in bring animation
-onto your Metahuman face rigs coming from either an exported Animation
-Sequence (more reliable but slower) or from a Level Sequence (faster but
-less reliable). Both have the same results. The one from the Level Seq
-can sometimes not work depending on Maya year and cut due to FBX
-incompatibility.
-
-Unreal Exporting Instructions:
-    * Open Metahuman Sample Project or your project with an
-      animated Metahuman face
-    * Open the Level Sequence
-    * Find your 'Face' Track
-    * For 'Import FBX Animation Sequence File'
-      + Right-Click on Face Track and 'Bake Animation Sequence'
-      + Pick a folder and save the file
-      + Right-Click on your new Animation Sequence
-      + Choose 'Asset Actions -> Export'
-      * Export Settings:
-        - FBX Export Compatibility: 2020
-        - Export Morph Targets: True
-        - Export Preview Mesh: True
-        - Map Skeleton Motion to Root: True
-        - Export Local Time: True
-
-    * For 'Import FBX Level Sequence File'
-      + Right-Click on Face Track and 'Bake To Control Rig'
-      + Choose 'Face_ControlBoard_CtrlRig'
-      + Use Default settings -> Create
-      + Right-Click on Face Track -> 'Export'
-      + Export Settings:
-        - FBX Export Compatibility: 2020
-        - Export Morph Targets: True
-        - Export Preview Mesh: True
-        - Map Skeleton Motion to Root: True
-        - Export Local Time: True
-
-Importing FBX data:
-    * First, select anything on your Metahuman character
-    * Click the 'Set Current Metahuman' and your character name
-      will appear in the field
-    * Choose which Import type to bring in
-    * Animation Sequence: 
-       + This is the most compatible but will take longer to process
-    * Level Sequence:
-      + Least compatible but is faster to apply
-
-Exporting FBX data:
-    * Select anything on your Metahuman character
-    * Click the 'Set Current Metahuman' and your character name
-      will appear in the field
-    * Navigate to a folder and name export file
-    * In Unreal:
-      + Open Level Sequence
-      + Right-Click 'Face_ControlBoard_CtrlRig' track
-      + 'Import Control Rig FBX'
-      + Set Control Mapping to 'Metahuman Control Mapping'
-
-Controls:
-    * Reset Facial Controls
-      + Will reset all the controls to a default position
-    * Select Facial Controls
-      + Will select all the controls
-		'''
-		bold_font = QtGui.QFont()
-		bold_font.setBold(True)
+		if HelpDialog._INFO is None:
+			help_path = os.path.join(os.path.dirname(__file__), HelpDialog._HELP_FILE)
+			try:
+				with open(help_path) as help_file:
+					HelpDialog._INFO = help_file.read()
+			except (IOError, OSError):
+				logger.warning('Unable to read help file: {}'.format(help_path))
+		info = HelpDialog._INFO or \
+			'Help file {} is missing.\nReinstall the tool to restore it.'.format(HelpDialog._HELP_FILE)
 		layout = QtWidgets.QVBoxLayout()
 		self.setLayout(layout)
 		
@@ -421,11 +373,11 @@ Controls:
 		
 		text_edit = QtWidgets.QPlainTextEdit(info)
 		text_edit.setReadOnly(True)
-		text_edit.setFont(bold_font)
+		text_edit.setFont(UI._BOLD_FONT)
 		container_layout.addWidget(text_edit)
 		
 		button = QtWidgets.QPushButton("Close")
-		button.clicked.connect(self.close)
+		button.clicked.connect(self.close, QtCore.Qt.DirectConnection)
 		container_layout.addWidget(button)
 		self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
 		self.setMinimumSize(675, 800)